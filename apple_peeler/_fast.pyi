@@ -0,0 +1 @@
+def split_entries(content: bytes) -> list[bytes]: ...
@@ -0,0 +1,39 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Compiled versions of the per-entry loops in `apple_peeler.extract`."""
+
+
+def split_entries(const unsigned char[::1] content) -> list:
+    """Split the content into entries.
+
+    Unlike the pure python generator this builds the whole list, callers should
+    only rely on the result being iterable.
+
+    :param content: An uncompressed chunk.
+    :raises ValueError: If an entry or its length runs past the end of the content.
+    :return: A list of UTF-8 encoded XML entries.
+    """
+    cdef Py_ssize_t pos = 0
+    cdef Py_ssize_t end = content.shape[0]
+    cdef Py_ssize_t length
+    cdef const unsigned char *buf
+    entries = []
+    if end == 0:
+        return entries
+
+    buf = &content[0]
+    while pos < end:
+        if pos + 4 > end:
+            raise ValueError(f"Truncated entry length at offset {pos}")
+        # 32-bit little-endian length
+        length = (
+            <Py_ssize_t>buf[pos]
+            | <Py_ssize_t>buf[pos + 1] << 8
+            | <Py_ssize_t>buf[pos + 2] << 16
+            | <Py_ssize_t>buf[pos + 3] << 24
+        )
+        pos += 4
+        if pos + length > end:
+            raise ValueError(f"Truncated entry at offset {pos}")
+        entries.append(buf[pos : pos + length])
+        pos += length
+    return entries
@@ -1,129 +1,216 @@
 #!/usr/bin/env python3
 """A script for finding and extracting Apple Dictionary files."""
-from typing import Optional
 
+from typing import Any, BinaryIO, Iterable, Iterator, Optional, Union
+
+import mmap
 import os
+import re
+import struct
+import sys
 import zlib
 
-from collections import Counter
+from collections import deque
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from functools import cached_property, lru_cache
+from itertools import chain
 from pathlib import Path
 
 import click
 
 from bs4 import BeautifulSoup
+from lxml import etree
+
+try:
+    # ISA-L inflates 2-3x faster than the stock zlib. Its decompressobj can drop
+    # the last couple of bytes of unused_data, so it's only used for one-shot
+    # decompression and the trailing data checks stay on the stock zlib.
+    from isal import isal_zlib as fast_zlib
+except ImportError:  # pragma: no cover
+    fast_zlib = zlib  # type: ignore[misc]
 
 DEBUG = False
 INT_SIZE = 4  # Number in the raw bytes are 32-bit little-endian integers
-HEADER_FIELD_SEP = b"\xff\xff\xff\xff"
+HEADER_FIELD_SEP = 0xFFFFFFFF
+# zlib header: deflate with a 32K window, followed by the level dependent flags
+ZLIB_HEADER = re.compile(b"\x78[\x01\x5e\x9c\xda]")
+# The header is 24 32-bit little-endian integers
+HEADER_STRUCT = struct.Struct("<24I")
+INT_STRUCT = struct.Struct("<I")
+# The two chunk sizes at the start of each chunk
+CHUNK_SIZES_STRUCT = struct.Struct("<II")
+DICTIONARY_OPEN = (
+    b"<d:dictionary "
+    b'xmlns="http://www.w3.org/1999/xhtml" '
+    b'xmlns:d="http://www.apple.com/DTDs/DictionaryService-1.0.rng">'
+)
+DICTIONARY_CLOSE = b"</d:dictionary>"
+# Blank text is kept, in mixed content it is the space between words
+PRETTY_PARSER = etree.XMLParser(huge_tree=True)
 DEFAULT_BASE = (
     "/System/Library/AssetsV2/"
     "com_apple_MobileAsset_DictionaryServices_dictionaryOSX/"
 )
 
 
-def to_int(number: bytes, *, byteorder: str = "little") -> int:
-    return int.from_bytes(number, byteorder=byteorder)
-
-
-def split_entries(content: bytes) -> list[str]:
+def split_entries(content: bytes) -> Iterable[bytes]:
     """Split the content into entries.
 
+    This is a generator, the compiled version in `_fast` returns a list, so only
+    rely on the result being iterable.
+
     :param content: An uncompress
-    :return: A list of XML strings.
+    :raises ValueError: If an entry or its length runs past the end of the content.
+    :return: The UTF-8 encoded XML entries.
     """
-    entries = []
-    while content:
-        length = to_int(content[:INT_SIZE])
-        entries.append(content[INT_SIZE : length + INT_SIZE].decode("UTF-8"))
-        content = content[INT_SIZE + length :]
-    return entries
-
-
-def process_chunk(compressed_chunk: bytes, strict: bool = True) -> list[str]:
+    # Walk the buffer with an offset rather than re-slicing the remainder,
+    # which would copy the rest of the content for every entry.
+    unpack_from = INT_STRUCT.unpack_from
+    pos = 0
+    end = len(content)
+    while pos < end:
+        if pos + INT_SIZE > end:
+            raise ValueError(f"Truncated entry length at offset {pos}")
+        (length,) = unpack_from(content, pos)
+        pos += INT_SIZE
+        if pos + length > end:
+            raise ValueError(f"Truncated entry at offset {pos}")
+        # Left encoded, they're only ever written back out as UTF-8
+        yield content[pos : pos + length]
+        pos += length
+
+
+try:
+    # The compiled version takes the interpreter out of the per-entry loop.
+    from apple_peeler._fast import split_entries  # noqa: F811
+except ImportError:  # pragma: no cover
+    pass
+
+
+def process_chunk(
+    compressed_chunk: Union[bytes, memoryview], strict: bool = True
+) -> Iterable[bytes]:
     """Expand and extract entries from the chunk.
 
+    The chunk is decompressed (and checked) straight away, but the entries are
+    only split out as the iterator is consumed.
+
     :param compressed_chunk: A compress byte string containing a zip.
     :param strict: Check that the size matches , defaults to True
 
-    :return: A list of XML entry strings from the chunk.
+    :return: The UTF-8 encoded XML entries from the chunk.
     """
     # Uncompressed size of chunk (4 bytes)
-    uncompressed_size = to_int(compressed_chunk[:INT_SIZE])
+    (uncompressed_size,) = INT_STRUCT.unpack_from(compressed_chunk)
 
-    decompressobj = zlib.decompressobj()
-    content_decompressed = decompressobj.decompress(compressed_chunk[INT_SIZE:])
+    zipped = memoryview(compressed_chunk)[INT_SIZE:]
     if strict:
+        # Only a decompressobj exposes trailing data after the zlib stream.
+        decompressobj = zlib.decompressobj()
+        content_decompressed = decompressobj.decompress(zipped)
         assert len(decompressobj.unused_data) == 0
         # Verify size
         assert len(content_decompressed) == uncompressed_size
+    else:
+        # The size is known up front so zlib can allocate the output once.
+        content_decompressed = fast_zlib.decompress(zipped, bufsize=uncompressed_size)
 
     return split_entries(content_decompressed)
 
 
-def extract_chunks(
-    content: bytes,
+def split_chunks(
+    content: Union[bytes, memoryview],
     num_chunks: int,
-) -> tuple[list[str], int]:
-    """Take an uncompressed chunk and split it into a list of XML strings.
+) -> tuple[list[memoryview], int]:
+    """Walk the chunk headers and slice out each compressed chunk.
 
-    :param content: An uncompressed string of bytes.
+    :param content: The chunk section of a Body.data file.
     :param num_chunks: How many chunks are in the content.
 
-    :return: A list of UTF-8 XML strings of dictionary entries.
+    :return: Views of the compressed chunks, and the size of the chunk section.
     """
-    entries = []
-    content_size = 0
-    for i in range(num_chunks):
+    unpack_from = CHUNK_SIZES_STRUCT.unpack_from
+    content = memoryview(content)
+    compressed_chunks = []
+    pos = 0
+    for _ in range(num_chunks):
         # This seems like a bug in the file format having the size twice,
         # maybe it was added to a wrapper twice or the like.
-        # Chunk size excluding 8 bytes
-        _chunk_size_1 = to_int(content[:INT_SIZE])  # noqa Unused
-        # Chunk size with the uncompressed size
-        chunk_size = to_int(content[INT_SIZE : INT_SIZE * 2])
-        # Content size plus 2 size headers
-        content_size += chunk_size + INT_SIZE * 2
-        content = content[INT_SIZE * 2 :]
-        compressed_chunk, content = (
-            content[:chunk_size],
-            content[chunk_size:],
-        )
+        # Chunk size excluding 8 bytes (unused) and
+        # chunk size with the uncompressed size
+        _chunk_size_1, chunk_size = unpack_from(content, pos)
+        pos += INT_SIZE * 2
+        compressed_chunks.append(content[pos : pos + chunk_size])
+        pos += chunk_size
 
-        chunk_entries = process_chunk(compressed_chunk)
-        entries.extend(chunk_entries)
-        if not DEBUG:
-            continue
-        click.echo(
-            f"Chunk #{i + 1}/{num_chunks}: {len(chunk_entries):03,} entries.", err=True
-        )
+    # Content size is each chunk plus its 2 size headers
+    return compressed_chunks, pos
+
+
+def extract_chunks(
+    compressed_chunks: list[memoryview],
+    *,
+    strict: bool = True,
+    max_workers: Optional[int] = None,
+) -> Iterator[Iterable[bytes]]:
+    """Decompress chunks and split them into XML entries.
 
-    return entries, content_size
+    The chunks are independent so they're decompressed concurrently (zlib releases
+    the GIL), with only a few in flight at once to keep memory bounded.
 
+    :param compressed_chunks: The compressed chunks from `split_chunks`.
+    :param strict: Check each chunk's size and trailing data, defaults to True
+    :param max_workers: Threads for decompressing chunks, defaults to the CPU count
 
-def find_zip(content_bytes: bytes) -> tuple[bytes, bytes]:
+    :return: An iterator of the UTF-8 encoded XML entries of each chunk.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: deque[Future[Iterable[bytes]]] = deque()
+        for compressed_chunk in compressed_chunks:
+            pending.append(executor.submit(process_chunk, compressed_chunk, strict))
+            if len(pending) > max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def find_zip(content_bytes: Union[bytes, memoryview]) -> tuple[bytes, bytes]:
     """Exploratory function for finding embedded zip chunks.
 
+    Only offsets that start with a zlib header are tried, rather than retrying
+    the decompression after stripping each byte.
+
     :param content_bytes: The file contents.
     :returns: The extracted, decompressed chunk, and the remainder of the string.
     """
-    stripped_bytes = b""
-    idx = 0
-    while True:
+    content_view = memoryview(content_bytes)
+    for match in ZLIB_HEADER.finditer(content_bytes):
+        idx = match.start()
         decompressobj = zlib.decompressobj()
         try:
-            content_decompressed = decompressobj.decompress(content_bytes)
-            break
+            content_decompressed = decompressobj.decompress(content_view[idx:])
         except zlib.error:
-            stripped_bytes += content_bytes[:1]
-            idx += 1
-            content_bytes = content_bytes[1:]
+            continue
+        break
+    else:
+        # No zlib stream, everything is discarded
+        idx = len(content_bytes)
+        decompressobj = zlib.decompressobj()
+        content_decompressed = b""
 
-    byte_string = "".join(f"{i:02x}" for i in stripped_bytes)
     if DEBUG:
+        byte_string = content_view[:idx].hex()
         click.echo(f"The discarded bytes were: {byte_string}", err=True)
     return content_decompressed, decompressobj.unused_data
 
 
-def process_body_data(content_bytes: bytes) -> list[str]:
+def split_body_data(content_bytes: Union[bytes, memoryview]) -> list[memoryview]:
     """Process Body.data file for Apple Dictionaries.
 
     The file format is:
@@ -147,107 +234,297 @@ def process_body_data(content_bytes: bytes) -> list[str]:
         zlib chunk (Chunk size 2 - 4 bytes long)
     \x00 padding (presumably to fill the remaining space in the final chunk)
 
+    The header, chunk sizes, and padding are all checked before anything is
+    decompressed.
+
     :param content_bytes: A byte-string of the file contents.
-    :return: A list of UTF-8 XML strings for entries.
+    :return: Views of the compressed chunks, in file order.
     """
-    entries: list[str] = []
-
-    header_bytes = content_bytes[:96]
-    content_bytes = content_bytes[96:]
+    header_bytes = content_bytes[: HEADER_STRUCT.size]
+    content_bytes = content_bytes[HEADER_STRUCT.size :]
     header_values = [
-        to_int(header_bytes[idx - INT_SIZE : idx])
-        for idx in range(len(header_bytes), 1, -INT_SIZE)
-        if header_bytes[idx - INT_SIZE : idx] != HEADER_FIELD_SEP
+        value
+        for value in reversed(HEADER_STRUCT.unpack(header_bytes))
+        if value != HEADER_FIELD_SEP
     ]
     num_chunks = header_values[0]
     header_size = header_values[2]
     header_content_size = header_values[4]
 
     # Check that the remainder of the header is all \x00's
-    zero_pad = Counter(header_bytes[:-header_size])[0]
+    # (bytes() is a no-op for bytes and a small copy for a memoryview)
+    zero_pad = bytes(header_bytes[:-header_size]).count(0)
     assert zero_pad == len(header_bytes) - header_size
 
-    entries, content_size = extract_chunks(content_bytes, num_chunks)
+    compressed_chunks, content_size = split_chunks(content_bytes, num_chunks)
     # Check that we got the expected amount of content
     # and that that end of the file is \x00 padded.
     content_bytes = content_bytes[content_size:]
     content_size += header_size
-    assert Counter(content_bytes)[0] == len(content_bytes)
+    assert bytes(content_bytes).count(0) == len(content_bytes)
     assert content_size == header_content_size
 
-    return entries
+    return compressed_chunks
+
+
+def iter_entries(
+    compressed_chunks: list[memoryview],
+    *,
+    strict: bool = True,
+    max_workers: Optional[int] = None,
+) -> Iterator[bytes]:
+    """Decompress the chunks of a Body.data file and yield their entries.
+
+    :param compressed_chunks: The compressed chunks from `split_body_data`.
+    :param strict: Check each chunk's size and trailing data, defaults to True
+    :param max_workers: Threads for decompressing chunks, defaults to the CPU count
+    :return: An iterator of UTF-8 encoded XML entries, in file order.
+    """
+    num_chunks = len(compressed_chunks)
+    chunks = extract_chunks(compressed_chunks, strict=strict, max_workers=max_workers)
+    if not DEBUG:
+        yield from chain.from_iterable(chunks)
+        return
+
+    for i, chunk_entries in enumerate(chunks):
+        num_entries = 0
+        for num_entries, entry in enumerate(chunk_entries, 1):
+            yield entry
+        click.echo(f"Chunk #{i + 1}/{num_chunks}: {num_entries:03,} entries.", err=True)
+
+
+def process_body_data(
+    content_bytes: Union[bytes, memoryview],
+    *,
+    strict: bool = True,
+    max_workers: Optional[int] = None,
+) -> list[bytes]:
+    """Process Body.data file for Apple Dictionaries.
+
+    :param content_bytes: A byte-string of the file contents.
+    :param strict: Check each chunk's size and trailing data, defaults to True
+    :param max_workers: Threads for decompressing chunks, defaults to the CPU count
+    :return: A list of UTF-8 encoded XML entries.
+    """
+    compressed_chunks = split_body_data(content_bytes)
+    return list(iter_entries(compressed_chunks, strict=strict, max_workers=max_workers))
+
+
+def prettify_entry(entry: bytes) -> bytes:
+    """Indent a single entry using lxml.
+
+    The entry is wrapped in the dictionary element so it's indented (and its
+    namespaces resolved) exactly as it would be in the full document.
+
+    :param entry: A UTF-8 encoded XML dictionary entry.
+    :return: The indented entry, including its trailing newline.
+    """
+    if not entry:
+        # Nothing to indent, and the slicing below expects an element
+        return b""
+    root = etree.fromstring(DICTIONARY_OPEN + entry + DICTIONARY_CLOSE, PRETTY_PARSER)
+    text = etree.tostring(root, encoding="UTF-8", pretty_print=True)
+    # Drop the dictionary tags, they're written once by the caller
+    return text[text.index(b"\n") + 1 : text.rindex(DICTIONARY_CLOSE)]
+
+
+def indent_entry(entry: bytes) -> bytes:
+    """Put an entry on its own indented line without parsing it.
+
+    :param entry: A UTF-8 encoded XML dictionary entry.
+    :return: The entry, indented inside the dictionary element.
+    """
+    return b"  " + entry + b"\n"
 
 
 def extract_body_data(
-    content_bytes: bytes,
+    content_bytes: Union[bytes, memoryview],
     outfile: Optional[Path] = None,
     *,
     prettify: bool = True,
+    legacy_prettify: bool = False,
+    strict: bool = True,
+    max_workers: Optional[int] = None,
 ) -> None:
     """Extract entries and save them to a file or print them to the console.
 
+    Entries are written out as their chunks are decompressed, so only a few chunks
+    are held in memory at once. Files are only replaced once they're complete.
+
     :param content_bytes: The Body.data file contents.
     :param outfile: The location to save the data, defaults to printing to the screen.
-    :param prettify: Format the file contents with BS4, defaults to True
+    :param prettify: Format the file contents with lxml, defaults to True
+    :param legacy_prettify: Format with BS4 instead of lxml, defaults to False
+    :param strict: Check each chunk's size and trailing data, defaults to True
+    :param max_workers: Threads for decompressing chunks, defaults to the CPU count
     """
-    entries = process_body_data(content_bytes)
-
-    dictionary_text = (
-        "<d:dictionary "
-        'xmlns="http://www.w3.org/1999/xhtml" '
-        'xmlns:d="http://www.apple.com/DTDs/DictionaryService-1.0.rng">'
-        + "".join(entries)
-        + "</d:dictionary>"
-    )
-    if prettify:
+    # Check the whole file up front so a bad file doesn't leave partial output
+    compressed_chunks = split_body_data(content_bytes)
+    entries = iter_entries(compressed_chunks, strict=strict, max_workers=max_workers)
+    legacy_prettify = prettify and legacy_prettify
+    if not prettify:
+        # The entries are already well-formed, putting them on their own lines
+        # is enough to keep the output readable without parsing anything.
+        entries = map(indent_entry, entries)
+    else:
         if DEBUG:
-            click.echo(f"Prettifying XML for {outfile.stem}", err=True)
-        dictionary_text = BeautifulSoup(dictionary_text, "lxml-xml").prettify()
+            click.echo(f"Prettifying XML for {outfile}", err=True)
+        if not legacy_prettify:
+            entries = map(prettify_entry, entries)
 
     if DEBUG:
-        click.echo(
-            f"Writing XML to {outfile}: Found {len(entries):,} entries", err=True
-        )
+        click.echo(f"Writing XML to {outfile}", err=True)
     if not outfile:
-        click.echo(dictionary_text, err=False)  # Output to stdout
-    else:
-        outfile.write_text(dictionary_text)
+        write_dictionary(sys.stdout.buffer, entries, legacy_prettify=legacy_prettify)
+        return
+
+    # Write next to the output and move it into place once it's complete,
+    # so a failure part way through doesn't leave a truncated file.
+    tmpfile = outfile.with_name(f".{outfile.name}.tmp")
+    try:
+        with tmpfile.open("wb") as stream:
+            write_dictionary(stream, entries, legacy_prettify=legacy_prettify)
+        os.replace(tmpfile, outfile)
+    except BaseException:
+        tmpfile.unlink(missing_ok=True)
+        raise
+
+
+def write_dictionary(
+    stream: BinaryIO, entries: Iterable[bytes], *, legacy_prettify: bool = False
+) -> None:
+    """Write the entries wrapped in the dictionary element.
 
+    :param stream: A binary stream to write the XML to.
+    :param entries: UTF-8 encoded XML entries, already formatted.
+    :param legacy_prettify: Format the whole document with BS4, defaults to False
+    """
+    if legacy_prettify:
+        # BS4 can only format the whole document at once
+        dictionary_text = (
+            DICTIONARY_OPEN + b"".join(entries) + DICTIONARY_CLOSE
+        ).decode("UTF-8")
+        dictionary_text = BeautifulSoup(dictionary_text, "lxml-xml").prettify()
+        stream.write(dictionary_text.encode("UTF-8"))
+        return
 
-def get_dictionaries(base: Path) -> list[tuple[str, list[Path]]]:
-    """Make a list of available dictionaries and the interesting files.
+    stream.write(DICTIONARY_OPEN + b"\n")
+    for entry in entries:
+        stream.write(entry)
+    stream.write(DICTIONARY_CLOSE + b"\n")
 
-    :param base: The Apple Dictionaries root directory.
-    :return: A list of tuples of name, files for each dictionary.
+
+def extract_dictionary(
+    name: str,
+    file: Path,
+    outfile: Optional[Path] = None,
+    *,
+    prettify: bool = True,
+    legacy_prettify: bool = False,
+    strict: bool = True,
+    max_workers: Optional[int] = None,
+) -> None:
+    """Extract the entries from a dictionary's Body.data file.
+
+    :param name: The name of the dictionary.
+    :param file: The dictionary's Body.data file.
+    :param outfile: The location to save the data, defaults to printing to the screen.
+    :param prettify: Format the file contents with lxml, defaults to True
+    :param legacy_prettify: Format with BS4 instead of lxml, defaults to False
+    :param strict: Check each chunk's size and trailing data, defaults to True
+    :param max_workers: Threads for decompressing chunks, defaults to the CPU count
     """
-    all_dicts = sorted(
-        (
-            (
-                dic.stem,
-                [
-                    f
-                    for f in (dic / "Contents" / "Resources").iterdir()
-                    if f.suffix != ".lproj"
-                ],
-            )
-            for dic_path in Path(base).iterdir()
-            if dic_path.is_dir()
-            for dic in (dic_path / "AssetData").iterdir()
-        ),
-        key=lambda x: x[0],
+    if DEBUG:
+        click.echo(f"Processing file: {name}/{file.name}", err=True)
+    # Map the file rather than reading it so the chunks are zero-copy views.
+    # The map is left to be released with the last view of it, closing it
+    # explicitly fails while an exception still references the views.
+    with file.open("rb") as f:
+        content_bytes = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    extract_body_data(
+        content_bytes,
+        outfile,
+        prettify=prettify,
+        legacy_prettify=legacy_prettify,
+        strict=strict,
+        max_workers=max_workers,
     )
-    return [(name, files) for name, files in all_dicts if files]
 
 
-def get_type() -> type:
+def set_debug(debug: bool) -> None:
+    """Set the DEBUG flag, also used to initialize worker processes.
+
+    :param debug: Output debug information to STDERR.
+    """
+    global DEBUG
+    DEBUG = debug
+
+
+@lru_cache(maxsize=4)
+def get_dictionaries(base: Path) -> list[tuple[str, Path]]:
+    """Make a list of available dictionaries and their Body.data files.
+
+    Uses `os.scandir` so the directory checks come from the cached entries
+    instead of a `stat` per path.
+
+    :param base: The Apple Dictionaries root directory.
+    :return: A list of tuples of name, Body.data path for each dictionary.
+    """
+    # Files of interest:
+    #  - KeyText.data
+    #  - EntryID.data
+    #  - KeyText.index
+    #  - EntryID.index
+    #  - Body.data
+    #  - DefaultStyle.css
+    # Only Body.data is extracted at the moment.
+    all_dicts = []
+    with os.scandir(base) as assets:
+        for asset in assets:
+            if not asset.is_dir():
+                continue
+            with os.scandir(os.path.join(asset.path, "AssetData")) as dics:
+                for dic in dics:
+                    resources = os.path.join(dic.path, "Contents", "Resources")
+                    with os.scandir(resources) as files:
+                        body_data = next(
+                            (f.path for f in files if f.name == "Body.data"), None
+                        )
+                    if body_data:
+                        all_dicts.append((Path(dic.name).stem, Path(body_data)))
+
+    return sorted(all_dicts, key=lambda x: x[0])
+
+
+def get_type() -> click.ParamType:
     """:return: a choice of dictionaries names or just accept a string."""
     base = Path(os.environ.get("DICT_BASE", DEFAULT_BASE))
     if not base.exists():
-        return str
+        return click.STRING
     else:
         return click.Choice(["all"] + [name for name, _ in get_dictionaries(base)])
 
 
+class LazyDictionaryType(click.ParamType):
+    """A dictionary name, only checked against `get_type` once a value is given.
+
+    The choices aren't listed in the help text, so neither importing the module
+    nor `--help` walks the dictionaries directory.
+    """
+
+    name = "text"
+
+    @cached_property
+    def param_type(self) -> click.ParamType:
+        return get_type()
+
+    def convert(self, *args: Any, **kwargs: Any) -> Any:
+        return self.param_type.convert(*args, **kwargs)
+
+    def shell_complete(self, *args: Any, **kwargs: Any) -> Any:
+        return self.param_type.shell_complete(*args, **kwargs)
+
+
 @click.command()
 @click.option(
     "--base",
@@ -267,7 +544,7 @@ def get_type() -> type:
 @click.option(
     "--dictionary",
     "-d",
-    type=get_type(),
+    type=LazyDictionaryType(),
     multiple=True,
     default=["all"],
     help="The dictionary to extract or 'all'. (Default: all) [Accepts multiple]",
@@ -276,7 +553,25 @@ def get_type() -> type:
     "--format-xml/--no-format-xml",
     default=False,
     is_flag=True,
-    help="Format the XML files using BeautifulSoup. (Default: False)",
+    help="Format the XML files using lxml. (Default: False)",
+)
+@click.option(
+    "--legacy-prettify",
+    default=False,
+    is_flag=True,
+    help=(
+        "Format the XML files using BeautifulSoup instead, requires --format-xml. "
+        "(Default: False)"
+    ),
+)
+@click.option(
+    "--strict/--no-strict",
+    default=True,
+    is_flag=True,
+    help=(
+        "Check each chunk's size and trailing data, --no-strict decompresses "
+        "faster. (Default: True)"
+    ),
 )
 @click.option(
     "--debug",
@@ -289,43 +584,65 @@ def main(
     out: Optional[str],
     dictionary: list[str],
     format_xml: bool,
+    legacy_prettify: bool,
+    strict: bool,
     debug: bool,
 ) -> None:
     """Extract XML from Apple Dictionary files."""
-    global DEBUG
-    DEBUG = debug
+    if legacy_prettify and not format_xml:
+        raise click.UsageError("--legacy-prettify requires --format-xml")
+    set_debug(debug)
 
     dictionaries = get_dictionaries(Path(base))
     if "all" in dictionary:
         extract_dictionaries = dictionaries
     else:
         extract_dictionaries = [
-            (name, files) for name, files in dictionaries if name in dictionary
+            (name, file) for name, file in dictionaries if name in dictionary
         ]
 
-    for idx, (name, files) in enumerate(extract_dictionaries):
-        # Files of interest:
-        #  - KeyText.data
-        #  - EntryID.data
-        #  - KeyText.index
-        #  - EntryID.index
-        #  - Body.data
-        #  - DefaultStyle.css
-        files = [f for f in files if f.name == "Body.data"]
-        if not files:
-            continue
-        file = files[0]
-
-        if DEBUG:
-            click.echo(f"Processing file: {name}/{file.name}", err=True)
-        extract_body_data(
-            file.read_bytes(),
-            Path(out).resolve() / (name + ".xml") if out else None,
-            prettify=format_xml,
+    cpu_count = os.cpu_count() or 1
+    # Stdout can only take one dictionary at a time
+    max_workers = max(min(len(extract_dictionaries), cpu_count), 1) if out else 1
+    # Share the cores between the dictionaries and their chunk pools
+    chunk_workers = max(cpu_count // max_workers, 1)
+    executor: Union[ThreadPoolExecutor, ProcessPoolExecutor]
+    if format_xml and max_workers > 1:
+        # Formatting holds the GIL for much of its work, so use processes for it
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers, initializer=set_debug, initargs=(debug,)
         )
-        if not DEBUG:
-            continue
-        click.echo(f"Processed {name}: {idx+1}/{len(extract_dictionaries)}.", err=True)
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    with executor:
+        futures = {
+            executor.submit(
+                extract_dictionary,
+                name,
+                file,
+                Path(out).resolve() / (name + ".xml") if out else None,
+                prettify=format_xml,
+                legacy_prettify=legacy_prettify,
+                strict=strict,
+                max_workers=chunk_workers,
+            ): name
+            for name, file in extract_dictionaries
+        }
+        try:
+            for idx, future in enumerate(as_completed(futures)):
+                future.result()
+                if not DEBUG:
+                    continue
+                name = futures[future]
+                click.echo(
+                    f"Processed {name}: {idx+1}/{len(extract_dictionaries)}.",
+                    err=True,
+                )
+        except BaseException:
+            # Stop at the first failure rather than finishing the queue
+            executor.shutdown(cancel_futures=True)
+            raise
 
 
 if __name__ == "__main__":
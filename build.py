@@ -0,0 +1,26 @@
+"""Build the optional Cython speedups for apple_peeler."""
+from typing import Any
+
+from setuptools import Extension
+
+
+def build(setup_kwargs: dict[str, Any]) -> None:
+    """Add the compiled extensions to the poetry generated setup.
+
+    The extensions are optional, without Cython or a working compiler the pure
+    python implementations are used instead.
+
+    :param setup_kwargs: The keyword arguments passed to `setup`.
+    """
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        return
+
+    extensions = [
+        Extension("apple_peeler._fast", ["apple_peeler/_fast.pyx"], optional=True)
+    ]
+    # Generate the C sources under build/ so they aren't packaged as module data
+    setup_kwargs.update(
+        ext_modules=cythonize(extensions, language_level=3, build_dir="build")
+    )
@@ -0,0 +1,171 @@
+import struct
+import zlib
+
+from pathlib import Path
+
+import pytest
+
+from click.testing import CliRunner
+
+from apple_peeler import extract
+
+
+def test_prettify_entry_keeps_mixed_content_whitespace() -> None:
+    entry = b'<d:entry><span class="ex"><b>big</b> <i>dog</i> runs</span></d:entry>'
+    assert b"<b>big</b> <i>dog</i> runs" in extract.prettify_entry(entry)
+
+
+def test_prettify_entry_indents_element_content() -> None:
+    entry = b"<d:entry><div><span>word</span></div></d:entry>"
+    assert extract.prettify_entry(entry) == (
+        b"  <d:entry>\n    <div>\n      <span>word</span>\n    </div>\n  </d:entry>\n"
+    )
+
+
+def test_prettify_entry_empty() -> None:
+    assert extract.prettify_entry(b"") == b""
+
+
+def make_body_data(chunks: list[list[bytes]], padding: bytes = b"\x00" * 16) -> bytes:
+    """Build a Body.data file with a chunk for each list of entries."""
+    content = b""
+    for entries in chunks:
+        raw = b"".join(struct.pack("<I", len(entry)) + entry for entry in entries)
+        chunk = struct.pack("<I", len(raw)) + zlib.compress(raw)
+        content += struct.pack("<II", len(chunk) + 4, len(chunk)) + chunk
+    header_size = 32
+    fields = [0] * 24
+    fields[23] = len(chunks)  # Number of chunks
+    fields[21] = header_size
+    fields[20] = extract.HEADER_FIELD_SEP
+    fields[18] = len(content) + header_size  # Content size
+    fields[17] = extract.HEADER_FIELD_SEP
+    return extract.HEADER_STRUCT.pack(*fields) + content + padding
+
+
+def test_process_body_data() -> None:
+    entries = [b"<d:entry>one</d:entry>", b"<d:entry>two</d:entry>"]
+    assert extract.process_body_data(make_body_data([entries])) == entries
+
+
+def test_process_body_data_keeps_chunk_order() -> None:
+    chunks = [
+        [f"<d:entry>{chunk}-{idx}</d:entry>".encode() for idx in range(chunk + 1)]
+        for chunk in range(10)
+    ]
+    # More chunks than workers, so the window is refilled as chunks finish
+    content_bytes = make_body_data(chunks)
+    entries = [entry for chunk in chunks for entry in chunk]
+    assert extract.process_body_data(content_bytes, max_workers=2) == entries
+
+
+def test_extract_body_data_bad_file_leaves_no_output(tmp_path: Path) -> None:
+    outfile = tmp_path / "Bad.xml"
+    content_bytes = make_body_data([[b"<d:entry/>"]], padding=b"\x00\x01")
+    with pytest.raises(AssertionError):
+        extract.extract_body_data(content_bytes, outfile, prettify=False)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_extract_body_data_failure_keeps_existing_output(tmp_path: Path) -> None:
+    outfile = tmp_path / "Bad.xml"
+    outfile.write_bytes(b"old")
+    # The lengths don't match the chunk, so this fails while decompressing
+    content_bytes = bytearray(make_body_data([[b"<d:entry/>"]]))
+    content_bytes[extract.HEADER_STRUCT.size + 8] += 1
+    with pytest.raises(AssertionError):
+        extract.extract_body_data(bytes(content_bytes), outfile, prettify=False)
+    assert [p.name for p in tmp_path.iterdir()] == ["Bad.xml"]
+    assert outfile.read_bytes() == b"old"
+
+
+@pytest.mark.parametrize("backend", ["zlib", "isal"])
+@pytest.mark.parametrize("trailing", [b"\x00", b"\x00\x00"])
+def test_process_chunk_strict_rejects_trailing_bytes(
+    monkeypatch: pytest.MonkeyPatch, backend: str, trailing: bytes
+) -> None:
+    if backend == "isal":
+        monkeypatch.setattr(extract, "fast_zlib", pytest.importorskip("isal.isal_zlib"))
+    else:
+        monkeypatch.setattr(extract, "fast_zlib", zlib)
+    raw = struct.pack("<I", 10) + b"<d:entry/>"
+    chunk = struct.pack("<I", len(raw)) + zlib.compress(raw) + trailing
+    with pytest.raises(AssertionError):
+        extract.process_chunk(chunk, strict=True)
+    assert list(extract.process_chunk(chunk, strict=False)) == [b"<d:entry/>"]
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        pytest.param(struct.pack("<I", 3) + b"abc" + b"\x01\x00", id="length"),
+        pytest.param(struct.pack("<I", 4) + b"abc", id="entry"),
+    ],
+)
+def test_split_entries_truncated(content: bytes) -> None:
+    with pytest.raises(ValueError, match="Truncated entry"):
+        list(extract.split_entries(content))
+
+
+def test_main_legacy_prettify_requires_format_xml(tmp_path: Path) -> None:
+    result = CliRunner().invoke(
+        extract.main, ["--base", str(tmp_path), "--legacy-prettify"]
+    )
+    assert result.exit_code == 2
+    assert "--legacy-prettify requires --format-xml" in result.output
+
+
+def test_find_zip_skips_false_header() -> None:
+    stream = zlib.compress(b"<d:entry/>")
+    # 0xff starts a deflate block with the reserved type, so this header fails
+    content = b"junk\x78\x9c\xff\xff" + stream + b"r"
+    assert extract.find_zip(content) == (b"<d:entry/>", b"r")
+
+
+def test_find_zip_without_stream() -> None:
+    assert extract.find_zip(b"no stream here") == (b"", b"")
+
+
+def test_find_zip_memoryview() -> None:
+    content = memoryview(b"xx" + zlib.compress(b"<d:entry/>") + b"rest")
+    assert extract.find_zip(content) == (b"<d:entry/>", b"rest")
+
+
+def make_dictionary(asset: Path, name: str, body_data: bool = True) -> Path:
+    resources = asset / "AssetData" / f"{name}.dictionary" / "Contents" / "Resources"
+    resources.mkdir(parents=True)
+    if body_data:
+        (resources / "Body.data").write_bytes(b"")
+    return resources / "Body.data"
+
+
+def test_get_dictionaries(tmp_path: Path) -> None:
+    extract.get_dictionaries.cache_clear()
+    base = tmp_path / "base"
+    english = make_dictionary(base / "a", "English")
+    make_dictionary(base / "b", "Incomplete", body_data=False)
+    japanese = make_dictionary(tmp_path / "elsewhere", "Japanese")
+    (base / "c").symlink_to(tmp_path / "elsewhere", target_is_directory=True)
+    (base / ".DS_Store").write_bytes(b"")
+    assert extract.get_dictionaries(base) == [
+        ("English", english),
+        ("Japanese", base / "c" / japanese.relative_to(tmp_path / "elsewhere")),
+    ]
+
+
+def test_main_help_does_not_list_dictionaries(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    def get_dictionaries(base: Path) -> list[tuple[str, Path]]:
+        raise AssertionError("--help walked the dictionaries directory")
+
+    monkeypatch.setattr(extract, "get_dictionaries", get_dictionaries)
+    monkeypatch.setenv("DICT_BASE", str(tmp_path))
+    # Drop any choices cached by earlier invocations
+    (dictionary,) = (
+        param for param in extract.main.params if param.name == "dictionary"
+    )
+    vars(dictionary.type).pop("param_type", None)
+    result = CliRunner().invoke(extract.main, ["--help"])
+    assert result.exit_code == 0, result.output
+    assert "-d, --dictionary TEXT" in result.output